@@ -1,8 +1,20 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .routes import chat, mandi, vision, translate
+from .services.genai_client import warm_up, close_client
 
-app = FastAPI(title="Kirana Shop Talk to Data")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the Gemini connection in the background so startup isn't delayed by it
+    warm_up_task = asyncio.create_task(warm_up())
+    yield
+    warm_up_task.cancel()
+    # Release pooled keep-alive connections cleanly
+    await close_client()
+
+app = FastAPI(title="Kirana Shop Talk to Data", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
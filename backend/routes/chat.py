@@ -1,4 +1,5 @@
 import os
+import logging
 from fastapi import APIRouter, Depends, HTTPException
 from .. import models
 from ..services.chat_service import process_chat_message
@@ -6,19 +7,17 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/chat", tags=["chat"])
 
 @router.post("/", response_model=models.ChatResponse)
 async def chat(request: models.ChatRequest):
     try:
-        # Convert Pydantic models to dicts for the service
-        history = [msg.dict() for msg in request.history]
-        
-        result = await process_chat_message(request.message, history, request.language, request.inventory)
+        # ChatMessage models go straight to the service, which reads .role/.content
+        result = await process_chat_message(request.message, request.history or [], request.language, request.inventory)
         return result
         
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        print(f"Error in chat endpoint: {str(e)}")
+        logger.exception(f"Error in chat endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
\ No newline at end of file
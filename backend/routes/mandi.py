@@ -1,4 +1,5 @@
 import os
+import asyncio
 import requests
 from fastapi import APIRouter, HTTPException
 from dotenv import load_dotenv
@@ -18,7 +19,8 @@ async def get_mandi_prices(limit: int = 10):
             "format": "json",
             "limit": limit
         }
-        response = requests.get(BASE_URL, params=params)
+        # requests is blocking; run it off the event loop so other requests keep flowing
+        response = await asyncio.to_thread(requests.get, BASE_URL, params=params, timeout=15)
         response.raise_for_status()
         data = response.json()
         
@@ -1,20 +1,18 @@
-import os
-import json
+import unicodedata
+from collections import OrderedDict
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from google import genai
 from google.genai import types
-from dotenv import load_dotenv
-
-load_dotenv()
+from ..services.genai_client import get_client
+from ..services.json_parser import parse_gemini_json
 
 router = APIRouter(prefix="/translate", tags=["translate"])
 
-# Configure Gemini
-api_key = os.getenv("GEMINI_API_KEY")
-client = None
-if api_key:
-    client = genai.Client(api_key=api_key)
+# Shared Gemini client (None if the API key is not configured)
+client = get_client()
+
+# Product-name translation is a short, simple task; the lite model is cheaper and faster for it
+TRANSLATE_MODEL = 'gemini-2.5-flash-lite'
 
 class TranslateRequest(BaseModel):
     text: str
@@ -23,8 +21,20 @@ class TranslateRequest(BaseModel):
 class TranslateResponse(BaseModel):
     translations: dict[str, str]
 
-# In-memory cache: {(text, tuple(sorted(targets))): translations_dict}
-translation_cache = {}
+# In-memory LRU cache: {(normalized_text, "hi,te,..."): translations_dict}
+TRANSLATION_CACHE_SIZE = 10_000
+translation_cache = OrderedDict()
+
+def make_cache_key(text: str, target_languages: list[str]) -> tuple[str, str]:
+    # NFKC + casefold so visually identical names ("Atta", "ATTA ") share an entry
+    normalized = unicodedata.normalize("NFKC", text).strip().casefold()
+    return normalized, ",".join(sorted(target_languages))
+
+def cache_translations(cache_key: tuple[str, str], translations: dict) -> None:
+    translation_cache[cache_key] = translations
+    translation_cache.move_to_end(cache_key)
+    if len(translation_cache) > TRANSLATION_CACHE_SIZE:
+        translation_cache.popitem(last=False)
 
 @router.post("/", response_model=TranslateResponse)
 async def translate_text(request: TranslateRequest):
@@ -32,14 +42,14 @@ async def translate_text(request: TranslateRequest):
         raise HTTPException(status_code=500, detail="Gemini API Key not configured")
 
     # Check cache
-    cache_key = (request.text.strip().lower(), tuple(sorted(request.target_languages)))
-    if cache_key in translation_cache:
+    cache_key = make_cache_key(request.text, request.target_languages)
+    cached = translation_cache.get(cache_key)
+    if cached is not None:
+        translation_cache.move_to_end(cache_key)
         print(f"Cache hit for: {request.text}")
-        return {"translations": translation_cache[cache_key]}
+        return {"translations": cached}
 
     try:
-        # model = genai.GenerativeModel('gemini-flash-latest', generation_config={"response_mime_type": "application/json"})
-        
         prompt = f"""
         Translate the following product name into these languages: {', '.join(request.target_languages)}.
         Product Name: "{request.text}"
@@ -49,26 +59,16 @@ async def translate_text(request: TranslateRequest):
         ensure the translation is accurate for a grocery store context.
         """
 
-        response = client.models.generate_content(
-            model='gemini-flash-latest',
+        response = await client.aio.models.generate_content(
+            model=TRANSLATE_MODEL,
             contents=prompt,
             config=types.GenerateContentConfig(response_mime_type="application/json")
         )
-        text_response = response.text.strip()
-        
-        # Parse JSON
-        try:
-            translations = json.loads(text_response)
-            translation_cache[cache_key] = translations
-            return {"translations": translations}
-        except json.JSONDecodeError:
-            # Fallback cleanup
-            clean_text = text_response.replace("```json", "").replace("```", "").strip()
-            translations = json.loads(clean_text)
-            
-            # Update cache
-            translation_cache[cache_key] = translations
-            return {"translations": translations}
+        # Parse JSON (tolerates markdown fences or prose in case they slip through)
+        translations = parse_gemini_json(response.text)
+
+        cache_translations(cache_key, translations)
+        return {"translations": translations}
 
     except Exception as e:
         print(f"Translation Error: {e}")
@@ -1,44 +1,60 @@
-import os
 import json
 import io
-from google import genai
+import asyncio
 from google.genai import types
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from PIL import Image
-from dotenv import load_dotenv
-
-load_dotenv()
+from ..services.genai_client import get_client
+from ..services.json_parser import parse_gemini_json
 
 router = APIRouter(prefix="/vision", tags=["vision"])
 
-api_key = os.getenv("GEMINI_API_KEY")
-
-# Initialize client conditionally
-client = None
-if api_key:
-    client = genai.Client(api_key=api_key)
-else:
-    print("Warning: GEMINI_API_KEY not found")
-
-# Helper function to clean generic markdown response if it slips through
-def clean_json_string(text: str) -> str:
-    text = text.strip()
-    if text.startswith("```json"):
-        text = text[7:]
-    if text.startswith("```"):
-        text = text[3:]
-    if text.endswith("```"):
-        text = text[:-3]
-    return text.strip()
+# Shared Gemini client (None if the API key is not configured)
+client = get_client()
+
+# Longest image edge sent to Gemini; larger phone photos are downscaled first
+MAX_IMAGE_EDGE = 1536
+
+# Reject uploads above this size before doing any work on them
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+
+# Formats Gemini accepts as-is, so small uploads can skip a decode/re-encode
+PASSTHROUGH_FORMATS = {"JPEG", "PNG", "WEBP"}
+
+def check_upload_size(file: UploadFile):
+    # Starlette records the size while spooling the multipart body, so this costs nothing
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="This photo is too large. Please upload an image under 10 MB.")
+
+def prepare_image(file: UploadFile) -> types.Part:
+    # Image.open only parses the header here; pixels are decoded lazily
+    image = Image.open(file.file)
+
+    if image.format in PASSTHROUGH_FORMATS and max(image.size) <= MAX_IMAGE_EDGE:
+        file.file.seek(0)
+        return types.Part.from_bytes(data=file.file.read(), mime_type=Image.MIME[image.format])
+
+    # For JPEGs, let libjpeg decode at a reduced scale (1/2, 1/4, 1/8) before resampling.
+    # draft() keeps both edges at or above the requested size, so ask for the target
+    # size at the image's own aspect ratio rather than a square box.
+    scale = MAX_IMAGE_EDGE / max(image.size)
+    image.draft("RGB", (int(image.width * scale), int(image.height * scale)))
+    image.thumbnail((MAX_IMAGE_EDGE, MAX_IMAGE_EDGE), Image.Resampling.LANCZOS)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=85, optimize=True)
+    return types.Part.from_bytes(data=buffer.getvalue(), mime_type="image/jpeg")
 
 @router.post("/ocr")
 async def process_bill(file: UploadFile = File(...)):
     if not client:
         raise HTTPException(status_code=500, detail="Gemini API Key not configured")
+    check_upload_size(file)
     
     try:
-        contents = await file.read()
-        image = Image.open(io.BytesIO(contents))
+        image_part = await asyncio.to_thread(prepare_image, file)
         
         prompt = """
         You are an expert OCR and Data Extraction Specialist.
@@ -57,17 +73,16 @@ async def process_bill(file: UploadFile = File(...)):
         Output strictly the JSON array.
         """
         
-        response = client.models.generate_content(
+        response = await client.aio.models.generate_content(
             model='gemini-2.5-flash-lite',
-            contents=[image, prompt],
+            contents=[image_part, prompt],
             config=types.GenerateContentConfig(
                 response_mime_type="application/json" # NATIVE JSON ENFORCEMENT
             )
         )
         
         # Parse string to JSON object before returning
-        cleaned_text = clean_json_string(response.text)
-        data = json.loads(cleaned_text)
+        data = parse_gemini_json(response.text)
         return {"data": data}
 
     except json.JSONDecodeError:
@@ -79,10 +94,10 @@ async def process_bill(file: UploadFile = File(...)):
 async def analyze_shelf(file: UploadFile = File(...)):
     if not client:
         raise HTTPException(status_code=500, detail="Gemini API Key not configured")
+    check_upload_size(file)
     
     try:
-        contents = await file.read()
-        image = Image.open(io.BytesIO(contents))
+        image_part = await asyncio.to_thread(prepare_image, file)
         
         prompt = """
         You are a Retail Planogram Auditor and Spatial Analysis AI. 
@@ -106,16 +121,15 @@ async def analyze_shelf(file: UploadFile = File(...)):
         - Do not invent shelf IDs if they are physically not visible in the image.
         """
         
-        response = client.models.generate_content(
+        response = await client.aio.models.generate_content(
             model='gemini-2.5-flash-lite',
-            contents=[image, prompt],
+            contents=[image_part, prompt],
             config=types.GenerateContentConfig(
                 response_mime_type="application/json" # NATIVE JSON ENFORCEMENT
             )
         )
         
-        cleaned_text = clean_json_string(response.text)
-        data = json.loads(cleaned_text)
+        data = parse_gemini_json(response.text)
         return {"data": data}
 
     except json.JSONDecodeError:
@@ -1,27 +1,29 @@
-import os
-import json
+import re
+import queue
+import atexit
+import orjson
 import logging
-import traceback
-from dotenv import load_dotenv
+from logging.handlers import QueueHandler, QueueListener
+from functools import lru_cache
+from itertools import dropwhile
 
 # New Google GenAI SDK
-from google import genai
 from google.genai import types
+from .genai_client import get_client
+from ..models import ChatMessage
 
 # Configure Logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-logger = logging.getLogger(__name__)
-
-# Load Environment Variables
-load_dotenv()
+# Records are queued on the request path and written to stderr by a background listener thread
+log_queue = queue.SimpleQueue()
+log_listener = QueueListener(log_queue, logging.StreamHandler())
+log_listener.start()
+atexit.register(log_listener.stop)
 
-api_key = os.getenv("GEMINI_API_KEY")
-client = None
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', handlers=[QueueHandler(log_queue)])
+logger = logging.getLogger(__name__)
 
-if api_key:
-    client = genai.Client(api_key=api_key)
-else:
-    logger.error("GEMINI_API_KEY is missing in environment variables.")
+# Shared Gemini client (None if the API key is not configured)
+client = get_client()
 
 # ---------------------------------------------------------------------------
 # 1. OPTIMIZED SYSTEM PROMPT
@@ -126,75 +128,204 @@ RESPONSE_SCHEMA = {
 }
 
 # ---------------------------------------------------------------------------
-# 3. MAIN CHAT PROCESSOR
+# 3. MODEL CONFIG (Built once at import, shared by every chat turn)
+# ---------------------------------------------------------------------------
+CHAT_MODEL = 'gemini-2.5-flash-lite'
+
+# Only the most recent messages are sent; older turns would be re-billed as input tokens on every request
+HISTORY_WINDOW = 16
+
+CHAT_CONFIG = types.GenerateContentConfig(
+    system_instruction=SYSTEM_PROMPT.strip(),
+    response_mime_type="application/json",
+    response_schema=RESPONSE_SCHEMA,
+    temperature=0.3, # Low temperature for accurate logic
+)
+
+# ---------------------------------------------------------------------------
+# 4. INVENTORY CONTEXT
+# ---------------------------------------------------------------------------
+def normalize_inventory_item(item: dict) -> tuple:
+    """Returns (name, stock, max_stock, shelf) for a single inventory entry."""
+    name = item.get('name', 'Unknown')
+    # Handle if name is a dict (e.g., multilingual names)
+    if isinstance(name, dict):
+        name = name.get('en', next(iter(name.values()), 'Unknown'))
+
+    return name, item.get('stock', 0), item.get('max_stock', 50), item.get('shelf_position', 'N/A')
+
+# The inventory rarely changes between consecutive turns, so identical snapshots reuse the formatted text
+@lru_cache(maxsize=32)
+def format_inventory_context(items: tuple) -> str:
+    if not items:
+        return "Current Shop Inventory:\n(Inventory is empty)"
+
+    lines = ["Current Shop Inventory:"]
+    for name, stock, max_stock, shelf in items:
+        # Dashboard Logic: Low if <= 50% of max_stock
+        status_tag = " [LOW STOCK]" if stock <= (max_stock * 0.5) else ""
+        lines.append(f"- {name}: {stock} (Shelf: {shelf}){status_tag}")
+    return "\n".join(lines)
+
+def build_inventory_context(inventory: list) -> str:
+    items = tuple(map(normalize_inventory_item, inventory or ()))
+    try:
+        return format_inventory_context(items)
+    except TypeError:
+        # Unhashable values in the client payload; format without caching
+        return format_inventory_context.__wrapped__(items)
+
+# ---------------------------------------------------------------------------
+# 5. LOCAL INTENTS (Answered without a Gemini round-trip)
+# ---------------------------------------------------------------------------
+# The clients wrap the user's words in a [SYSTEM CONTEXT] block; the utterance follows the last marker
+USER_TEXT_RE = re.compile(r".*(?:User Query|User Spoke):\s*(.*)\Z", re.DOTALL)
+
+LOW_STOCK_RE = re.compile(
+    r"\b(?:low[\s-]?stock|stock (?:is )?low|running low|kam stock|stock kam)\b"
+    r"|कम स्टॉक|स्टॉक कम|తక్కువ స్టాక్",
+    re.IGNORECASE,
+)
+
+LOW_STOCK_REPLIES = {
+    "en": ("Items running low:", "These items are running low: {items}.", "Stock looks good."),
+    "hi": ("कम स्टॉक वाले सामान:", "ये सामान कम हो रहे हैं: {items}।", "स्टॉक ठीक है।"),
+    "te": ("తక్కువ స్టాక్ ఉన్న వస్తువులు:", "ఈ వస్తువులు తక్కువగా ఉన్నాయి: {items}.", "స్టాక్ బాగానే ఉంది."),
+}
+
+# Whole-utterance matches only, so "hi, sold 2 milk" still goes to Gemini
+GREETING_RE = re.compile(
+    r"^(?:hi|hello|hey|namaste|namaskar|namaskaram|vanakkam|नमस्ते|नमस्कार|నమస్కారం|నమస్తే)"
+    r"(?:\s+(?:there|ji|kirana\s*ai))?[\s.!?]*$",
+    re.IGNORECASE,
+)
+THANKS_RE = re.compile(
+    r"^(?:thanks|thank you|thank u|dhanyavad|dhanyawad|shukriya|dhanyavadalu|धन्यवाद|शुक्रिया|ధన్యవాదాలు)"
+    r"(?:\s+(?:ji|so much|a lot))?[\s.!?]*$",
+    re.IGNORECASE,
+)
+
+# (greeting, thanks) replies per language
+SMALL_TALK_REPLIES = {
+    "en": ("Namaste! Ready to manage the shop?", "You're welcome! Anything else for the shop?"),
+    "hi": ("नमस्ते! दुकान संभालने के लिए तैयार हैं?", "आपका स्वागत है! दुकान के लिए और कुछ?"),
+    "te": ("నమస్కారం! షాప్ నిర్వహణకు సిద్ధమా?", "మీకు స్వాగతం! షాప్ కోసం ఇంకేమైనా కావాలా?"),
+}
+
+def extract_user_text(message: str) -> str:
+    match = USER_TEXT_RE.match(message)
+    return (match.group(1) if match else message).strip()
+
+def mentions_inventory_item(user_text: str, inventory: list) -> bool:
+    """True if any inventory item name (in any language) appears in the utterance."""
+    text = user_text.casefold()
+    for item in inventory or ():
+        raw_name = item.get('name')
+        names = raw_name.values() if isinstance(raw_name, dict) else (raw_name,)
+        if any(isinstance(name, str) and name.strip() and name.strip().casefold() in text for name in names):
+            return True
+    return False
+
+def local_low_stock_reply(inventory: list, language: str) -> dict:
+    """Lists [LOW STOCK] items straight from the request inventory."""
+    header, speech_template, all_good = LOW_STOCK_REPLIES[language]
+
+    low_items = []
+    for item in inventory or ():
+        name, stock, max_stock, _ = normalize_inventory_item(item)
+        raw_name = item.get('name')
+        if isinstance(raw_name, dict):
+            name = raw_name.get(language) or name
+        # Same rule as the [LOW STOCK] tag in the inventory context
+        if stock <= (max_stock * 0.5):
+            low_items.append((name, stock))
+
+    if not low_items:
+        return {"response": all_good, "speech": all_good, "action": "NONE", "params": {}}
+
+    lines = [header]
+    lines.extend(f"- {name}: {stock}" for name, stock in low_items)
+    speech = speech_template.format(items=", ".join(name for name, _ in low_items))
+    return {"response": "\n".join(lines), "speech": speech, "action": "NONE", "params": {}}
+
+def local_small_talk_reply(user_text: str, language: str) -> dict | None:
+    """Returns a canned reply for a bare greeting or thanks, otherwise None."""
+    greeting, thanks = SMALL_TALK_REPLIES[language]
+    if GREETING_RE.match(user_text):
+        reply = greeting
+    elif THANKS_RE.match(user_text):
+        reply = thanks
+    else:
+        return None
+    return {"response": reply, "speech": reply, "action": "NONE", "params": {}}
+
+# ---------------------------------------------------------------------------
+# 6. MAIN CHAT PROCESSOR
 # ---------------------------------------------------------------------------
-async def process_chat_message(message: str, history: list = [], language: str = "en", inventory: list = []) -> dict:
+async def process_chat_message(message: str, history: list[ChatMessage] = [], language: str = "en", inventory: list = []) -> dict:
+    user_text = extract_user_text(message)
+
+    # "Hello" / "Thanks" need no model at all
+    if language in SMALL_TALK_REPLIES:
+        small_talk = local_small_talk_reply(user_text, language)
+        if small_talk:
+            return small_talk
+
+    # "What is running low?" only needs the inventory we already have.
+    # Quantities imply a sale/stock update, and a named product is a GET_INFO/UPDATE_STOCK
+    # question about that item, so both still go to Gemini.
+    if language in LOW_STOCK_REPLIES and LOW_STOCK_RE.search(user_text) and not any(c.isdigit() for c in user_text):
+        try:
+            if not mentions_inventory_item(user_text, inventory):
+                return local_low_stock_reply(inventory, language)
+        except (TypeError, AttributeError):
+            logger.warning("Malformed inventory for local low-stock reply, falling back to Gemini")
+
     if not client:
         return {"response": "System Error: API Key missing.", "action": "NONE"}
 
     try:
         # 1. Prepare History for Gemini
-        gemini_history = []
-        for msg in history:
-            role = "user" if msg.get("role") == "user" else "model"
-            gemini_history.append(types.Content(
-                role=role, 
-                parts=[types.Part.from_text(text=msg.get("content"))]
-            ))
+        # Sliding window over the history, starting on a user turn as Gemini expects
+        recent_history = dropwhile(lambda msg: msg.role != "user", history[-HISTORY_WINDOW:])
+        from_text = types.Part.from_text
+        gemini_history = [
+            types.Content(
+                role="user" if msg.role == "user" else "model",
+                parts=[from_text(text=msg.content)]
+            )
+            for msg in recent_history
+        ]
 
         # 2. Format Inventory Context
         # We inject this dynamically into the prompt so the AI knows what's in the shop
-        inventory_context = "Current Shop Inventory:\n"
-        if inventory:
-            for item in inventory:
-                name = item.get('name', 'Unknown')
-                # Handle if name is a dict (e.g., multilingual names)
-                if isinstance(name, dict):
-                    name = name.get('en', list(name.values())[0])
-                
-                stock = item.get('stock', 0)
-                max_stock = item.get('max_stock', 50)
-                # Dashboard Logic: Low if <= 50% of max_stock
-                is_low = stock <= (max_stock * 0.5)
-                
-                shelf = item.get('shelf_position', 'N/A')
-                status_tag = " [LOW STOCK]" if is_low else ""
-                inventory_context += f"- {name}: {stock} (Shelf: {shelf}){status_tag}\n"
-        else:
-            inventory_context += "(Inventory is empty)"
+        inventory_context = build_inventory_context(inventory)
 
         logger.info(f"Inventory Context items: {len(inventory)}")
 
         # 3. Construct the dynamic user prompt
-        full_prompt = f"""
-{inventory_context}
-
-User Input: "{message}"
-Detected Language Context: {language}
-"""
+        full_prompt = "\n".join((
+            inventory_context,
+            "",
+            f'User Input: "{message}"',
+            f"Detected Language Context: {language}",
+        ))
 
-        # 4. Create Chat Session
-        # Note: 'gemini-1.5-flash' is the standard fast model. 
-        # Update model name if you have access to specific versions like 'gemini-2.5-flash-lite'
-        chat = client.chats.create(
-            model='gemini-2.5-flash-lite', 
-            config=types.GenerateContentConfig(
-                system_instruction=SYSTEM_PROMPT,
-                response_mime_type="application/json",
-                response_schema=RESPONSE_SCHEMA, 
-                temperature=0.3, # Low temperature for accurate logic
-            ),
+        # 4. Create Chat Session (reuses the prebuilt config)
+        chat = client.aio.chats.create(
+            model=CHAT_MODEL,
+            config=CHAT_CONFIG,
             history=gemini_history
         )
 
         # 5. Send Message
-        response = chat.send_message(full_prompt)
+        response = await chat.send_message(full_prompt)
         raw_text = response.text
 
         # 6. Parse JSON (Guaranteed by Schema)
         try:
-            data = json.loads(raw_text)
-        except json.JSONDecodeError:
+            data = orjson.loads(raw_text)
+        except orjson.JSONDecodeError:
             logger.error(f"JSON Parse Failed. Raw: {raw_text}")
             return {
                 "response": "I understood, but had a technical glitch.", 
@@ -213,8 +344,7 @@ Detected Language Context: {language}
         }
 
     except Exception as e:
-        logger.error(f"Global Error in process_chat_message: {e}")
-        traceback.print_exc()
+        logger.exception(f"Global Error in process_chat_message: {e}")
         return {
             "response": "I'm having trouble connecting right now.",
             "speech": "Connection error, please try again.",
@@ -241,11 +371,11 @@ if __name__ == "__main__":
         # Test 1: Location Query
         print("\n--- Test: Location Query ---")
         res = await process_chat_message("where is milk?", inventory=mock_inventory, language="en")
-        print(f"User: where is milk?\nAI: {json.dumps(res, indent=2)}")
+        print(f"User: where is milk?\nAI: {orjson.dumps(res, option=orjson.OPT_INDENT_2).decode()}")
 
         # Test 2: Location Query (Hindi Context)
         print("\n--- Test: Location Query (Hindi) ---")
         res2 = await process_chat_message("doodh kahan hai?", inventory=mock_inventory, language="hi")
-        print(f"User: doodh kahan hai?\nAI: {json.dumps(res2, indent=2)}")
+        print(f"User: doodh kahan hai?\nAI: {orjson.dumps(res2, option=orjson.OPT_INDENT_2).decode()}")
 
     asyncio.run(test())
\ No newline at end of file
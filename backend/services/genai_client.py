@@ -0,0 +1,66 @@
+import os
+import logging
+from functools import lru_cache
+import httpx
+from dotenv import load_dotenv
+
+from google import genai
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Upper bound for a single Gemini request (milliseconds)
+REQUEST_TIMEOUT_MS = 60_000
+
+# Keep-alive pool shared by all Gemini calls, so concurrent requests reuse warm TLS connections
+POOL_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=60)
+
+
+@lru_cache(maxsize=1)
+def get_client():
+    """
+    Returns the process-wide Gemini client, or None if GEMINI_API_KEY is not set.
+    All routes share this instance so they reuse one connection pool instead of
+    each opening their own.
+    """
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        logger.error("GEMINI_API_KEY is missing in environment variables.")
+        return None
+
+    return genai.Client(
+        api_key=api_key,
+        http_options=types.HttpOptions(
+            timeout=REQUEST_TIMEOUT_MS,
+            client_args={"limits": POOL_LIMITS},
+            async_client_args={"limits": POOL_LIMITS},
+        ),
+    )
+
+
+async def warm_up(model: str = "gemini-2.5-flash-lite"):
+    """
+    Opens the async connection pool ahead of the first user request by fetching
+    model metadata (no tokens are generated or billed).
+    """
+    client = get_client()
+    if not client:
+        return
+
+    try:
+        await client.aio.models.get(model=model)
+        logger.info("Gemini connection warmed up.")
+    except Exception as e:
+        logger.warning(f"Gemini warm-up failed: {e}")
+
+
+async def close_client():
+    """Closes the shared client's sync and async connection pools on shutdown."""
+    client = get_client()
+    if not client:
+        return
+
+    await client.aio.aclose()
+    client.close()
@@ -0,0 +1,41 @@
+import re
+import json
+import orjson
+
+# Reasoning blocks some models prepend to their answer
+THINK_BLOCK_RE = re.compile(r"<think>.*?</think>", re.DOTALL)
+
+# A whole response wrapped in a ```json ... ``` (or bare ```) fence
+MARKDOWN_FENCE_RE = re.compile(r"^\s*```(?:json)?|```\s*$")
+
+JSON_DECODER = json.JSONDecoder()
+
+
+def parse_gemini_json(text: str):
+    """
+    Parses JSON out of a Gemini response, trying the cheapest strategy first:
+    1. The text as-is (the normal case with response_mime_type="application/json")
+    2. The text with <think> blocks and markdown fences removed
+    3. The first JSON array/object found anywhere in the text, ignoring prose around it
+
+    Raises json.JSONDecodeError if no strategy yields valid JSON.
+    """
+    if not text:
+        raise json.JSONDecodeError("Empty response", text or "", 0)
+
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        pass
+
+    cleaned = MARKDOWN_FENCE_RE.sub("", THINK_BLOCK_RE.sub("", text)).strip()
+    try:
+        return orjson.loads(cleaned)
+    except orjson.JSONDecodeError:
+        pass
+
+    starts = [i for i in (cleaned.find("["), cleaned.find("{")) if i >= 0]
+    if not starts:
+        raise json.JSONDecodeError("No JSON value found", cleaned, 0)
+    data, _ = JSON_DECODER.raw_decode(cleaned, min(starts))
+    return data